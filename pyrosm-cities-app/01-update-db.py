@@ -12,6 +12,10 @@ from pyprojroot import here
 from django.utils.text import slugify
 import numpy as np
 
+from compact_geometry import write_compact
+from measure import add_measurements
+from summary_store import summarise_layer, write_summary
+
 """This script is used to generate or overwrite a database of
 pyrosm-derived features for use with the pyrosm-cities-app. This is to
 avoid the demanding processing load that causes out of memory error on
@@ -20,9 +24,10 @@ shinyapps.io.
 # configure script
 CONF = toml.load(here("pyrosm-cities-app/config/01-update-db.toml"))
 AOI = CONF["cities"]["aoi"]
-MODES = CONF["network"]["modes"]
 BBOXES = CONF["osm"]["bbox"]
 REGIONS = CONF["osm"]["region"]
+LAYERS = CONF["layers"]
+OUTPUT = CONF["output"]
 # find osm available cities & compare with AOI
 cities = [x.lower() for x in sources.cities.available]
 # extract the available networks & write to disk
@@ -34,104 +39,49 @@ except FileExistsError:
 # date for vintages
 vint = datetime.strftime(datetime.now(), "%Y-%m-%d")
 
-# ingest the data to tmp - don't store as too large, create osm objects
-transp = "|".join(["aero", "railway", "highway", "motorway", "road", "runway"]).lower()
-
-agri = "|".join(
-    [
-        "Allotments",
-        "Animal",
-        "Farm",
-        "Field",
-        "Flowerbed",
-        "Forest",
-        "Grass",
-        "Green",
-        "Horticulture",
-        "Meadow",
-        "Orchard",
-        "plant_nursery",
-        "Scrub",
-        "Shrubs",
-        "Vineyard",
-        "Apiary",
-        "Aquaculture",
-        "Arboretum",
-        "Growing",
-        "Pasture",
-    ]
-).lower()
-
-rec = "|".join(
-    [
-        "Contains recreation",
-        "Park",
-        "Leisure",
-        "Sport",
-        "Recreation",
-        "Tourism",
-        "Playing ",
+# compile the reclassification rules once for all cities
+for layer_nm, layer in LAYERS.items():
+    # the summary store groups by reclass_col, which only exists with rules
+    if bool(layer.get("reclass_col")) != bool(layer.get("rules")):
+        raise ValueError(
+            f"Layer {layer_nm} must set both or neither of reclass_col & rules."
+        )
+    layer["rules"] = [
+        (rule["class"], re.compile(rule["pattern"], re.IGNORECASE))
+        for rule in layer.get("rules", [])
     ]
-)
 
-commerce = "|".join(
-    [
-        "Commercial",
-        "Depot",
-        "Retail",
-        "Storage",
-        "Warehouse",
-        "Hospitality",
-        "Logistics",
-    ]
-)
 
-indus = "|".join(["Industrial", "Factory", "Industr", "Quarry"])
+def reclassify(classes, rules):
+    """Apply each (class, pattern) rule in turn to the output of the last."""
+    out = list()
+    for cls in classes:
+        for new_cls, pat in rules:
+            if bool(pat.search(cls)):
+                cls = new_cls
+        out.append(cls)
+    return out
 
-amen = "|".join(
-    [
-        "Landfill",
-        "Cemetery",
-        "Military",
-        "Parking",
-        "Religious",
-        "Health",
-        "car_park",
-        "Church",
-        "Education",
-        "Government",
-        "^hospital$",
-        "Sewage",
-    ]
-)
 
-develop = "|".join(["proposed_construction", "Construction", "proposed_station"])
-
-trans_pat = re.compile(transp, re.IGNORECASE)
-agri_pat = re.compile(agri, re.IGNORECASE)
-rec_pat = re.compile(rec, re.IGNORECASE)
-comm_pat = re.compile(commerce, re.IGNORECASE)
-indus_pat = re.compile(indus, re.IGNORECASE)
-amen_pat = re.compile(amen, re.IGNORECASE)
-dev_pat = re.compile(develop, re.IGNORECASE)
+def extract_layer(osm, layer):
+    """Extract, filter & reclassify one registry layer from a pyrosm.OSM."""
+    gdf = getattr(osm, layer["getter"])(**layer.get("kwargs", {}))
+    drop_types = layer.get("drop_geom_types", [])
+    if drop_types:
+        gdf = gdf[np.array(~gdf.geom_type.isin(drop_types), dtype=bool)]
+    # keep only features of interest
+    gdf = gdf.loc[:, layer["columns"] + ["geometry"]]
+    if layer["rules"]:
+        gdf[layer["reclass_col"]] = reclassify(gdf[layer["columns"][0]], layer["rules"])
+    return add_measurements(gdf)
 
-rock_pat = re.compile(
-    r"rock|cliff|shingle|sand|stone|scree|gorge|ridge|landslide|mountain", re.IGNORECASE
-)
-water_pat = re.compile(
-    r"bay|beach|coast|spring|water|wet|shoal|river|flood|reed", re.IGNORECASE
-)
-green_pat = re.compile(
-    r"grass|mud|heath|tree|shrub|scrub|scub|wood|forest|field|earth|meadow|lawn|fell",
-    re.IGNORECASE,
-)
 
-osm_cities = dict()
+# ingest the data to tmp - don't store as too large, find the osm files
+osm_fps = dict()
 for city in AOI:
     if city in cities:
         # logic to ingest city data from pyrosm
-        fp = pyrosm.get_data(city)
-        osm_cities[city] = pyrosm.OSM(fp)
+        osm_fps[city] = pyrosm.get_data(city)
     else:
         # logic to ingest region data with pyrosm, then use osmium to filter to bbox
         # get the OSM for the region
@@ -155,108 +105,40 @@ for city in AOI:
                 out_tmp,
             ]
         )
-        osm_cities[city] = pyrosm.OSM(out_tmp)
+        osm_fps[city] = out_tmp
 
-n_cities = len(osm_cities)
-n_nets = n_cities * len(MODES)
-n = 1
+# one job per city extracts every layer from the same pyrosm.OSM, which
+# caches the decoded pbf after the first getter, so each pbf is read once
+n_cities = len(osm_fps)
 probs = []
-# road network
-for city, osm in osm_cities.items():
-    for mod in MODES:
-        print(f"Extracting network {n} of {n_nets}")
+for n, (city, fp) in enumerate(osm_fps.items(), start=1):
+    print(f"Extracting {len(LAYERS)} layers for city {n} of {n_cities}")
+    osm = pyrosm.OSM(fp)
+    written = []
+    for layer_nm, layer in LAYERS.items():
         try:
-            net = osm.get_network(network_type=mod)
-            # slugify standardises filenames
-            slug = slugify(f"{city}-net-{mod}-{vint}")
-            fname = os.path.join(out_pth, f"{slug}.arrow")
-            # retain only columns of interest
-            net = net.loc[:, ["geometry", "length", "maxspeed"]]
-            print(f"Writing net to {fname}")
-            net.to_feather(fname)
+            gdf = extract_layer(osm, layer)
         except (DecodeError, ValueError):
             print(f"OSM encoding problem encountered with {city}. Skipping.")
             probs.append(city)
-            pass
-        n += 1
-
-# remove any city that threw a decode error
-for prob in probs:
-    del osm_cities[prob]
-    n_cities -= 1
-
-# extract land use features & write to disk
-n = 1
-for city, osm in osm_cities.items():
-    print(f"Extracting landuse features {n} of {n_cities}")
-    landuse = osm.get_landuse()
-    slug = slugify(f"{city}-landuse-{vint}")
-    fname = os.path.join(out_pth, f"{slug}.arrow")
-    # filter out point data
-    landuse = landuse[np.array(landuse.geom_type != "Point", dtype=bool)]
-    # keep only features of interest
-    landuse = landuse.loc[:, ["landuse", "geometry"]]
-    # reclassify
-    landuse["reclassified_landuse"] = landuse.landuse
-    landuse.reclassified_landuse = [
-        "transport" if bool(trans_pat.search(land_class)) else land_class
-        for land_class in landuse.reclassified_landuse
-    ]
-    landuse.reclassified_landuse = [
-        "agriculture" if bool(agri_pat.search(land_class)) else land_class
-        for land_class in landuse.reclassified_landuse
-    ]
-    landuse.reclassified_landuse = [
-        "recreation" if bool(rec_pat.search(land_class)) else land_class
-        for land_class in landuse.reclassified_landuse
-    ]
-    landuse.reclassified_landuse = [
-        "commerce" if bool(comm_pat.search(land_class)) else land_class
-        for land_class in landuse.reclassified_landuse
-    ]
-    landuse.reclassified_landuse = [
-        "industry" if bool(indus_pat.search(land_class)) else land_class
-        for land_class in landuse.reclassified_landuse
-    ]
-    landuse.reclassified_landuse = [
-        "amenities" if bool(amen_pat.search(land_class)) else land_class
-        for land_class in landuse.reclassified_landuse
-    ]
-    landuse.reclassified_landuse = [
-        "development" if bool(dev_pat.search(land_class)) else land_class
-        for land_class in landuse.reclassified_landuse
-    ]
-    print(f"Writing landuse features to {fname}")
-    landuse.to_feather(fname)
-    n += 1
-
-# finally with green space
-n = 1
-for city, osm in osm_cities.items():
-    print(f"Extracting natural features {n} of {n_cities}")
-    nat = osm.get_natural()
-    slug = slugify(f"{city}-natural-{vint}")
-    fname = os.path.join(out_pth, f"{slug}.arrow")
-    # filter out point data
-    nat = nat[np.array(nat.geom_type != "Point", dtype=bool)]
-    # keep only features of interest
-    nat = nat.loc[:, ["natural", "geometry"]]
-    # reclassify the natural columns
-    # reclassify
-    nat["reclassified_natural"] = nat.natural
-
-    nat.reclassified_natural = [
-        "rock" if bool(rock_pat.search(nat_class)) else nat_class
-        for nat_class in nat.reclassified_natural
-    ]
-    nat.reclassified_natural = [
-        "water" if bool(water_pat.search(nat_class)) else nat_class
-        for nat_class in nat.reclassified_natural
-    ]
-    nat.reclassified_natural = [
-        "green" if bool(green_pat.search(nat_class)) else nat_class
-        for nat_class in nat.reclassified_natural
-    ]
-    print(f"Writing natural features to {fname}")
-    nat.to_feather(fname)
-    n += 1
+            # the app lists any city with files, so drop its partial layers
+            for fname in written:
+                os.remove(fname)
+            break
+        # slugify standardises filenames
+        slug = slugify(f"{city}-{layer_nm}-{vint}")
+        fname = os.path.join(out_pth, f"{slug}.arrow")
+        print(f"Writing {layer_nm} to {fname}")
+        if OUTPUT["compact"]:
+            write_compact(gdf, fname, precision=OUTPUT["precision"])
+        else:
+            gdf.to_feather(fname)
+        written.append(fname)
+        # append the city to the cross-city summary store
+        summ = summarise_layer(gdf, layer_nm, layer.get("reclass_col"), vint)
+        written.append(write_summary(summ, out_pth, slugify(city), layer_nm))
+    # release the decoded pbf before the next city
+    del osm
+
+if probs:
+    print(f"Cities skipped: {', '.join(probs)}")
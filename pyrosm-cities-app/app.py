@@ -1,18 +1,39 @@
+import importlib
 import re
 import os
+import threading
 
-from shiny import ui, render, App, reactive
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import pandas as pd
+import toml
+from shiny import ui, render, App, reactive, req
 import shinyswatch
 
+from compact_geometry import read_layer
+from summary_store import compare_cities, read_summary
+
+# import the geospatial stack in the background so that the UI renders first.
+# server functions import these again, blocking only until the warm up is done
+DEFERRED_IMPORTS = ["pandas", "geopandas", "matplotlib.pyplot"]
+
+
+def _warm_imports():
+    for mod in DEFERRED_IMPORTS:
+        importlib.import_module(mod)
+
+
+# set PYROSM_APP_WARM_IMPORTS=0 to skip the warm up, eg when profiling imports,
+# as its imports would otherwise be reported within those of the app
+if os.environ.get("PYROSM_APP_WARM_IMPORTS", "1") != "0":
+    threading.Thread(target=_warm_imports, daemon=True).start()
+
 # set working directory to that expected by deployment
 os.chdir(os.path.dirname(os.path.realpath(__file__)))
-# get the available city values
-found_fs = os.listdir("data/")
+# get the available city values, ignoring the summary store
+found_fs = [f for f in os.listdir("data/") if f.endswith(".arrow")]
 cities = [f.split("-")[0] for f in found_fs]
 cities = list(set(cities))
+# the layer registry used by 01-update-db.py defines the selectable features
+LAYERS = toml.load("config/01-update-db.toml")["layers"]
+layer_nms = list(LAYERS)
 
 
 app_ui = ui.page_fixed(
@@ -41,8 +62,8 @@ app_ui = ui.page_fixed(
             ui.input_select(
                 id="featureSelector",
                 label="Select a feature:",
-                choices=["net-driving", "landuse", "natural"],
-                selected="landuse",
+                choices=layer_nms,
+                selected="landuse" if "landuse" in LAYERS else layer_nms[0],
             ),
             ui.input_select(
                 id="crsSelector",
@@ -60,6 +81,9 @@ app_ui = ui.page_fixed(
             ui.output_plot("viz_feature"),
             ui.output_table("summ_table"),
             ui.input_action_button(id="show_mod", label="Notes"),
+            ui.h2(ui.output_text("compare_txt")),
+            ui.output_plot("compare_plot"),
+            ui.output_table("compare_table"),
         ),
     ),
 )
@@ -69,14 +93,17 @@ def server(input, output, session):
     @reactive.event(input.runButton)
     def return_data():
         # return the required geodataframe
-        search_pat = re.compile(f"{input.citySelector()}-{input.featureSelector()}.*")
+        search_pat = re.compile(
+            f"{input.citySelector()}-{input.featureSelector()}-[0-9]{{4}}"
+        )
         dat_pth = "data/"
         all_files = os.listdir(dat_pth)
         found = [
             os.path.join(dat_pth, fn) for fn in all_files if bool(search_pat.search(fn))
         ]
         pth = found[0]
-        dat = gpd.read_feather(pth)
+        # decodes compact files, reads plain feather files as is
+        dat = read_layer(pth)
         dat = dat.to_crs(input.crsSelector())
         return (dat, pth)
 
@@ -95,20 +122,15 @@ def server(input, output, session):
 
     @reactive.event(input.runButton)
     def selected_feature():
-        # Selecting column to colour plot depends on selected feature
-        colour_col = reactive.Value(None)
-        if input.featureSelector() == "net-driving":
-            colour_col.set(None)
-        elif input.featureSelector() == "natural":
-            colour_col.set("reclassified_natural")
-        else:
-            colour_col.set("reclassified_landuse")
-        return colour_col()
+        # colour the plot by the reclassified column, if the layer has one
+        return LAYERS[input.featureSelector()].get("reclass_col")
 
     @output
     @render.plot
     @reactive.event(input.runButton)
     def viz_feature():
+        import matplotlib.pyplot as plt
+
         with ui.Progress(min=1, max=100) as p:
             p.set(message="Working", detail="Sit tight...")
 
@@ -128,34 +150,60 @@ def server(input, output, session):
     @render.table
     @reactive.event(input.runButton)
     def summ_table():
+        import pandas as pd
+
         tab_dict = dict()
         dat = return_data()[0]
-        if input.featureSelector() == "net-driving":
-            tab_dict["Total length (km)"] = [int(sum(dat["length"]) / 1000)]
+        if selected_feature() is None:
+            tab_dict["Total length (km)"] = [int(dat["length_km"].sum())]
             return pd.DataFrame.from_dict(tab_dict, orient="columns")
         else:
-            dat["area_km"] = dat.area / 1000000
-            # marseilles has a nat feature that results in a negative area, remove
-            dat = dat[dat["area_km"] > 0]
-            tot_area = sum(dat["area_km"])
+            # areas are measured at build time, independent of selected CRS
+            tot_area = dat["area_km2"].sum()
             summ_tab = (
-                dat.groupby(selected_feature())
-                .sum("area_km")
+                dat.groupby(selected_feature())["area_km2"]
+                .sum()
                 .round(3)
-                .sort_values(by="area_km", ascending=False)
+                .sort_values(ascending=False)
                 .reset_index()
             )
-            summ_tab["perc_total"] = round(summ_tab["area_km"] / tot_area * 100, 3)
+            summ_tab["perc_total"] = round(summ_tab["area_km2"] / tot_area * 100, 3)
             return summ_tab
 
-    @reactive.Effect
     @reactive.event(input.runButton)
-    def _():
-        if input.crsSelector() == "wgs84":
-            ui.notification_show(
-                "CRS is geographic. Results from 'area' are likely incorrect.",
-                type="warning",
-            )
+    def compare_data():
+        # one query over the summary store, no geometry is read
+        metric = LAYERS[input.featureSelector()].get("compare_metric", "area_km2")
+        summ = read_summary("data/", input.featureSelector())
+        # nothing to compare, eg data built before the summary store
+        req(not summ.empty)
+        return (compare_cities(summ, metric), metric)
+
+    @output
+    @render.text
+    def compare_txt():
+        return f"Compare {input.featureSelector()} across cities".title()
+
+    @output
+    @render.plot
+    def compare_plot():
+        wide, metric = compare_data()
+        # largest city at the top of the chart
+        ax = (
+            wide.drop(columns="total")
+            .iloc[::-1]
+            .plot.barh(stacked=True, figsize=(16, 8))
+        )
+        ax.set(xlabel=metric, ylabel=None)
+        ax.legend(loc="upper left", bbox_to_anchor=(1, 1))
+
+    @output
+    @render.table
+    def compare_table():
+        wide, metric = compare_data()
+        tab = wide.round(3).reset_index()
+        tab.insert(0, "rank", range(1, len(tab) + 1))
+        return tab.rename(columns={"total": f"total_{metric}"})
 
     @reactive.Effect
     @reactive.event(input.show_mod)
@@ -172,8 +220,9 @@ def server(input, output, session):
         else:
             t_txt.set("OSM Landuse / Natural Features")
             p_txt.set(
-                "Accurate area calculation requires an appropriate CRS to be"
-                " selected. Categories have been grouped to improve plotting."
+                "Areas are calculated in a local equal area projection, so are"
+                " unaffected by the selected CRS. Categories have been grouped"
+                " to improve plotting."
                 " Click outside of this window to return to the app."
             )
 
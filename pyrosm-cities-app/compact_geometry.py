@@ -0,0 +1,286 @@
+"""Compact Arrow IPC encoding for the app's feature layers.
+
+Coordinates are quantised to a fixed precision and stored as int32 deltas
+from the previous coordinate in the same ring, in a nested
+list<list<list<[x, y]>>> column of geometry > parts > rings > coordinates.
+String columns are dictionary encoded and the file is zstd compressed.
+`read_layer()` decodes these files, and reads plain geopandas feather files
+unchanged.
+"""
+import json
+
+# schema metadata key marking a compact file
+META_KEY = b"compact_geometry"
+GEOM_TYPE_COL = "geom_type"
+GEOM_COL = "geometry_q"
+# pygeos type ids that can be encoded, -1 is a missing geometry
+POINT, LINESTRING, POLYGON, MULTILINESTRING, MULTIPOLYGON = 0, 1, 3, 5, 6
+SUPPORTED_TYPES = [-1, POINT, LINESTRING, POLYGON, MULTILINESTRING, MULTIPOLYGON]
+
+
+def _offsets_from_counts(counts):
+    import numpy as np
+
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+
+
+def _is_first(idx):
+    """Mask the first of each run of equal values in sorted `idx`."""
+    import numpy as np
+
+    return np.concatenate([[True], idx[1:] != idx[:-1]])
+
+
+def _compact_index(idx):
+    """Map sorted, possibly gappy indices to 0..n-1 for pygeos `indices`."""
+    import numpy as np
+
+    # sorted input, so avoid the sort in np.unique
+    return np.cumsum(_is_first(idx)) - 1
+
+
+def encode_geometries(geoms, precision):
+    """
+    Encode geometries as quantised coordinate deltas.
+
+    Args:
+        geoms (array-like): Shapely or pygeos geometries. Points,
+        (Multi)LineStrings and (Multi)Polygons are supported.
+        precision (float): Coordinate precision in CRS units, eg 1e-6
+        degrees.
+
+    Returns:
+        numpy.ndarray: int8 pygeos type id of each geometry.
+        pyarrow.ListArray: The nested, delta encoded coordinates.
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pygeos
+
+    geoms = pygeos.from_shapely(np.asarray(geoms, dtype=object))
+    # empty geometries have no parts to rebuild from, store them as missing
+    geoms[pygeos.is_empty(geoms)] = None
+    type_ids = pygeos.get_type_id(geoms)
+    unsupported = ~np.isin(type_ids, SUPPORTED_TYPES)
+    if unsupported.any():
+        raise ValueError(
+            f"Cannot encode geometry type id {type_ids[unsupported][0]}. "
+            f"Supported type ids are {SUPPORTED_TYPES}."
+        )
+
+    # geometry > parts, single part geometries are their own part
+    parts, part_geom = pygeos.get_parts(geoms, return_index=True)
+    geom_offsets = _offsets_from_counts(np.bincount(part_geom, minlength=len(geoms)))
+
+    # parts > rings, lines & points are treated as a single ring
+    is_poly = pygeos.get_type_id(parts) == POLYGON
+    poly_rings, ring_part = pygeos.get_rings(parts[is_poly], return_index=True)
+    ring_part = np.flatnonzero(is_poly)[ring_part]
+    rings = np.concatenate([poly_rings, parts[~is_poly]])
+    ring_part = np.concatenate([ring_part, np.flatnonzero(~is_poly)])
+    order = np.argsort(ring_part, kind="stable")
+    rings = rings[order]
+    part_offsets = _offsets_from_counts(
+        np.bincount(ring_part[order], minlength=len(parts))
+    )
+
+    # rings > coordinates, each ring starts from its absolute position
+    n_coords = pygeos.get_num_coordinates(rings)
+    ring_offsets = _offsets_from_counts(n_coords)
+    quant = np.round(pygeos.get_coordinates(rings) / precision).astype(np.int64)
+    deltas = quant.copy()
+    deltas[1:] -= quant[:-1]
+    starts = ring_offsets[:-1][n_coords > 0]
+    deltas[starts] = quant[starts]
+    if deltas.size and np.abs(deltas).max() >= 2**31:
+        raise ValueError("`precision` is too fine to store coordinates as int32.")
+
+    xy = pa.FixedSizeListArray.from_arrays(pa.array(deltas.ravel(), pa.int32()), 2)
+    rings_arr = pa.ListArray.from_arrays(pa.array(ring_offsets), xy)
+    parts_arr = pa.ListArray.from_arrays(pa.array(part_offsets), rings_arr)
+    geom_arr = pa.ListArray.from_arrays(pa.array(geom_offsets), parts_arr)
+
+    return (type_ids.astype(np.int8), geom_arr)
+
+
+def _flatten(arr):
+    """Zero-based offsets & child values of a possibly sliced ListArray."""
+    offsets = arr.offsets.to_numpy()
+    return (offsets - offsets[0], arr.flatten())
+
+
+def decode_geometries(type_ids, geom_arr, precision, lib=None):
+    """
+    Decode the output of `encode_geometries()`.
+
+    Args:
+        type_ids (numpy.ndarray): pygeos type id of each geometry.
+        geom_arr (pyarrow.ListArray): The nested, delta encoded coordinates.
+        precision (float): Coordinate precision used to encode.
+        lib (module, optional): Library to build the geometries with, pygeos
+        or shapely >= 2, which share the same vectorised constructors.
+        Defaults to None, using pygeos.
+
+    Returns:
+        numpy.ndarray: Array of `lib` geometries.
+    """
+    import numpy as np
+
+    if lib is None:
+        import pygeos as lib
+
+    geom_offsets, parts_arr = _flatten(geom_arr)
+    part_offsets, rings_arr = _flatten(parts_arr)
+    ring_offsets, xy_arr = _flatten(rings_arr)
+    xy = xy_arr.flatten().to_numpy().astype(np.int64).reshape(-1, 2)
+
+    # undo the deltas with one cumulative sum, rebased at each ring start
+    n_coords = np.diff(ring_offsets)
+    cum = np.cumsum(xy, axis=0)
+    base = np.zeros((len(n_coords), 2), dtype=np.int64)
+    has_coords = n_coords > 0
+    starts = ring_offsets[:-1][has_coords]
+    base[has_coords] = cum[starts] - xy[starts]
+    coords = (cum - np.repeat(base, n_coords, axis=0)) * precision
+
+    n_parts = np.diff(geom_offsets)
+    part_geom = np.repeat(np.arange(len(n_parts)), n_parts)
+    part_type = type_ids[part_geom]
+    ring_part = np.repeat(np.arange(len(part_geom)), np.diff(part_offsets))
+    ring_type = part_type[ring_part]
+
+    def _ring_coords(ring_mask):
+        # coordinates of the masked rings & the index of their ring among them
+        if ring_mask.all():
+            # eg a layer of only polygons, no need to copy the coordinates
+            return (coords, np.repeat(np.arange(len(n_coords)), n_coords))
+        coord_mask = np.repeat(ring_mask, n_coords)
+        ring_idx = np.repeat(np.arange(ring_mask.sum()), n_coords[ring_mask])
+        return (coords[coord_mask], ring_idx)
+
+    parts = np.empty(len(part_geom), dtype=object)
+    is_poly = np.isin(part_type, [POLYGON, MULTIPOLYGON])
+    if is_poly.any():
+        ring_poly = np.isin(ring_type, [POLYGON, MULTIPOLYGON])
+        poly_coords, poly_ring = _ring_coords(ring_poly)
+        rings = lib.linearrings(poly_coords, indices=poly_ring)
+        parts[is_poly] = lib.polygons(
+            rings, indices=_compact_index(ring_part[ring_poly])
+        )
+    is_line = np.isin(part_type, [LINESTRING, MULTILINESTRING])
+    if is_line.any():
+        ring_line = np.isin(ring_type, [LINESTRING, MULTILINESTRING])
+        line_coords, line_ring = _ring_coords(ring_line)
+        parts[is_line] = lib.linestrings(line_coords, indices=line_ring)
+    is_point = part_type == POINT
+    if is_point.any():
+        parts[is_point] = lib.points(_ring_coords(ring_type == POINT)[0])
+
+    geoms = np.full(len(type_ids), None, dtype=object)
+    single = np.isin(part_type, [POINT, LINESTRING, POLYGON])
+    geoms[part_geom[single]] = parts[single]
+    for multi_type, constructor in [
+        (MULTILINESTRING, lib.multilinestrings),
+        (MULTIPOLYGON, lib.multipolygons),
+    ]:
+        multi = part_type == multi_type
+        if multi.any():
+            multi_geom = part_geom[multi]
+            geoms[multi_geom[_is_first(multi_geom)]] = constructor(
+                parts[multi], indices=_compact_index(multi_geom)
+            )
+
+    return geoms
+
+
+def write_compact(gdf, fname, precision=1e-6):
+    """
+    Write a GeoDataFrame as a compact, zstd compressed Arrow IPC file.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Features to write.
+        fname (str): Path to write to, conventionally ending ".arrow".
+        precision (float, optional): Coordinate precision in CRS units.
+        Defaults to 1e-6, around 0.1 m in degrees.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    from pyarrow import feather
+
+    type_ids, geom_arr = encode_geometries(gdf.geometry.values, precision)
+    attrs = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+    # dictionary encode the string columns
+    str_cols = attrs.select_dtypes("object").columns
+    attrs = attrs.astype({col: "category" for col in str_cols})
+
+    table = pa.Table.from_pandas(attrs, preserve_index=False)
+    table = table.append_column(GEOM_TYPE_COL, pa.array(type_ids))
+    table = table.append_column(GEOM_COL, geom_arr)
+    info = {
+        "version": 1,
+        "precision": precision,
+        "crs": gdf.crs.to_json() if gdf.crs else None,
+    }
+    meta = dict(table.schema.metadata or {})
+    meta[META_KEY] = json.dumps(info).encode()
+    table = table.replace_schema_metadata(meta)
+    feather.write_feather(table, fname, compression="zstd")
+
+
+def _geometry_lib():
+    """
+    The library geopandas holds geometries with, to decode straight into.
+
+    Returns:
+        module: pygeos if geopandas uses it, otherwise shapely if it has
+        vectorised constructors (>= 2). None for shapely < 2.
+    """
+    import geopandas as gpd
+    import shapely
+
+    if gpd.options.use_pygeos:
+        import pygeos
+
+        return pygeos
+    if int(shapely.__version__.split(".")[0]) >= 2:
+        return shapely
+    return None
+
+
+def read_layer(fname):
+    """
+    Read a feature layer written by `write_compact()` or `to_feather()`.
+
+    Args:
+        fname (str): Path to the .arrow file.
+
+    Returns:
+        gpd.GeoDataFrame: The features, with categorical string columns if
+        the file is compact.
+    """
+    import geopandas as gpd
+    from pyarrow import feather
+
+    table = feather.read_table(fname)
+    meta = table.schema.metadata or {}
+    if META_KEY not in meta:
+        return gpd.read_feather(fname)
+
+    info = json.loads(meta[META_KEY])
+    lib = _geometry_lib()
+    geoms = decode_geometries(
+        table.column(GEOM_TYPE_COL).to_numpy(),
+        table.column(GEOM_COL).combine_chunks(),
+        info["precision"],
+        lib=lib,
+    )
+    if lib is None:
+        import pygeos
+
+        # shapely < 2 has no vectorised constructors, convert from pygeos
+        geoms = pygeos.to_shapely(geoms)
+    attrs = table.drop([GEOM_TYPE_COL, GEOM_COL]).to_pandas()
+    # the geometries are already those of the geopandas backend, so they are
+    # wrapped as is. from_shapely() would re-check every element in python
+    geom_col = gpd.array.GeometryArray(geoms, crs=info["crs"])
+    return gpd.GeoDataFrame(attrs, geometry=geom_col)
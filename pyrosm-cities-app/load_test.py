@@ -0,0 +1,382 @@
+"""Load test the pyrosm-cities-app with simulated concurrent sessions.
+
+Serves the app in-process with uvicorn and drives each simulated session
+over the Shiny websocket protocol, as a browser would: select a city,
+feature and CRS, then click Go. Records the latency of each output and the
+peak memory of the process, and writes a JSON report that can be compared
+with an earlier run.
+
+Usage, from the pyrosm-cities-app folder:
+    python load_test.py --sessions 10 --rounds 3
+    python load_test.py --sessions 10 --baseline ../outputs/load-test-<ts>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+# outputs timed after each click of runButton
+OUTPUTS = ["viz_feature", "summ_table", "compare_plot", "compare_table"]
+# other outputs a browser would show, rendered but not timed
+UNTIMED_OUTPUTS = ["return_plt_txt", "compare_txt"]
+FEATURES = ["net-driving", "landuse", "natural"]
+CRSS = ["wgs84", "27700", "2154"]
+PLOT_SIZE = {"width": 800, "height": 600}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(asgi_app, port):
+    """
+    Serve an ASGI app with uvicorn on a background thread.
+
+    Args:
+        asgi_app (shiny.App): The app to serve.
+        port (int): Port to serve on, on 127.0.0.1.
+
+    Returns:
+        uvicorn.Server: The running server. Set `should_exit` to stop it.
+    """
+    import uvicorn
+
+    config = uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="error")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def _init_inputs(city, feature, crs):
+    inputs = {
+        "citySelector": city,
+        "featureSelector": feature,
+        "crsSelector": crs,
+        "runButton:shiny.action": 0,
+        "show_mod:shiny.action": 0,
+        ".clientdata_pixelratio": 1,
+    }
+    # outputs are only computed once the client reports them as visible
+    for out in OUTPUTS + UNTIMED_OUTPUTS:
+        inputs[f".clientdata_output_{out}_hidden"] = False
+        for dim, px in PLOT_SIZE.items():
+            inputs[f".clientdata_output_{out}_{dim}"] = px
+    return inputs
+
+
+async def _await_flush(ws, timeout):
+    """
+    Wait for the flush that ends Shiny's handling of the last client message.
+
+    Shiny sends one "values" message after handling each init or update
+    message, after any "recalculating" messages for the outputs it
+    recomputed. Waiting for it stops those messages being read as the
+    response to the next click.
+    """
+    deadline = time.perf_counter() + timeout
+    while True:
+        remaining = deadline - time.perf_counter()
+        try:
+            msg = json.loads(await asyncio.wait_for(ws.recv(), remaining))
+        except asyncio.TimeoutError:
+            return
+        if "values" in msg:
+            return
+
+
+async def _await_outputs(ws, t0, timeout):
+    """
+    Wait for every output in `OUTPUTS` to be sent after a click at `t0`.
+
+    Shiny normally reports each output as "recalculated" as soon as it has
+    been computed, but sends all values together once every output is done. The
+    latency of an output is taken from its "recalculated" status message.
+    Only outputs reported as "recalculating" after the click are counted.
+
+    Returns:
+        dict: Latency in ms of each output, plus "delivered", the latency
+        until every value has reached the client.
+        set: Names of outputs that raised an error.
+    """
+    latency = dict()
+    started = set()
+    delivered = set()
+    errors = set()
+    deadline = t0 + timeout
+    while len(delivered) < len(OUTPUTS):
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        try:
+            msg = json.loads(await asyncio.wait_for(ws.recv(), remaining))
+        except asyncio.TimeoutError:
+            break
+        t = (time.perf_counter() - t0) * 1000
+        status = msg.get("recalculating", {})
+        if status.get("status") == "recalculating":
+            started.add(status["name"])
+        elif status.get("status") == "recalculated" and status["name"] in started:
+            latency.setdefault(status["name"], t)
+        errors.update(set(msg.get("errors", {})) & started)
+        for out in (set(msg.get("values", {})) | errors) & started & set(OUTPUTS):
+            delivered.add(out)
+            latency.setdefault(out, t)
+    if len(delivered) == len(OUTPUTS):
+        latency["delivered"] = t
+    # only count outputs the client has actually received
+    latency = {
+        out: ms for out, ms in latency.items() if out in delivered | {"delivered"}
+    }
+    return (latency, errors)
+
+
+async def run_session(url, cities, rounds, seed, timeout, results):
+    """
+    Drive one simulated session through `rounds` selections.
+
+    Args:
+        url (str): Base http url of the served app.
+        cities (list): City names to choose from.
+        rounds (int): Number of times to make a selection & click Go.
+        seed (int): Seed for the random selections.
+        timeout (float): Seconds to wait for all outputs after each click.
+        results (dict): Collects latencies, errors & timeouts, updated in place.
+    """
+    import websockets
+
+    rng = random.Random(seed)
+    t0 = time.perf_counter()
+    await asyncio.to_thread(lambda: urllib.request.urlopen(url).read())
+    results["page_load"].append((time.perf_counter() - t0) * 1000)
+
+    ws_url = url.replace("http", "ws", 1) + "websocket/"
+    async with websockets.connect(ws_url, max_size=None) as ws:
+        inputs = _init_inputs(rng.choice(cities), FEATURES[1], CRSS[0])
+        await ws.send(json.dumps({"method": "init", "data": inputs}))
+        # the init flush reports the click outputs, empty until runButton
+        await _await_flush(ws, timeout)
+        for click in range(1, rounds + 1):
+            selection = {
+                "citySelector": rng.choice(cities),
+                "featureSelector": rng.choice(FEATURES),
+                "crsSelector": rng.choice(CRSS),
+            }
+            await ws.send(json.dumps({"method": "update", "data": selection}))
+            await _await_flush(ws, timeout)
+            t0 = time.perf_counter()
+            await ws.send(
+                json.dumps(
+                    {"method": "update", "data": {"runButton:shiny.action": click}}
+                )
+            )
+            latency, errors = await _await_outputs(ws, t0, timeout)
+            for out in OUTPUTS + ["delivered"]:
+                if out not in latency:
+                    results["timeouts"][out] += 1
+                elif out in errors:
+                    results["errors"][out] += 1
+                else:
+                    results["latency"][out].append(latency[out])
+
+
+def summarise_latency(latencies):
+    """p50, p95, p99 & max in ms of a list of latencies."""
+    if not latencies:
+        return {"n": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    if len(latencies) == 1:
+        cuts = latencies * 99
+    else:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "n": len(latencies),
+        "p50_ms": round(cuts[49], 1),
+        "p95_ms": round(cuts[94], 1),
+        "p99_ms": round(cuts[98], 1),
+        "max_ms": round(max(latencies), 1),
+    }
+
+
+def _git_commit():
+    try:
+        res = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        )
+    except FileNotFoundError:
+        return None
+    return res.stdout.strip() or None
+
+
+def _data_bytes(data_pth):
+    total = 0
+    for root, _, files in os.walk(data_pth):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+async def _run_sessions(url, cities, sessions, rounds, seed, timeout, results):
+    await asyncio.gather(
+        *[
+            run_session(url, cities, rounds, seed + i, timeout, results)
+            for i in range(sessions)
+        ]
+    )
+
+
+def run_load_test(sessions=10, rounds=3, seed=42, timeout=120.0):
+    """
+    Serve the app in-process & run `sessions` concurrent simulated sessions.
+
+    Args:
+        sessions (int, optional): Number of concurrent sessions. Defaults to 10.
+        rounds (int, optional): Selections made by each session. Defaults to 3.
+        seed (int, optional): Seed for the random selections. Defaults to 42.
+        timeout (float, optional): Seconds to wait for all outputs after each
+        click of runButton. Defaults to 120.0.
+
+    Returns:
+        dict: The report, with latency percentiles per output and for
+        "delivered", when all outputs reach the client, error & timeout
+        counts and the peak RSS of the process in MB.
+    """
+    # importing the app also sets the working directory to its folder
+    sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+    import app as cities_app
+
+    port = _free_port()
+    rss_before = _peak_rss_mb()
+    server = start_server(cities_app.app, port)
+    results = {
+        "page_load": list(),
+        "latency": {out: list() for out in OUTPUTS + ["delivered"]},
+        "errors": {out: 0 for out in OUTPUTS + ["delivered"]},
+        "timeouts": {out: 0 for out in OUTPUTS + ["delivered"]},
+    }
+    t0 = time.perf_counter()
+    try:
+        asyncio.run(
+            _run_sessions(
+                f"http://127.0.0.1:{port}/",
+                cities_app.cities,
+                sessions,
+                rounds,
+                seed,
+                timeout,
+                results,
+            )
+        )
+    finally:
+        server.should_exit = True
+    wall_s = time.perf_counter() - t0
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "settings": {
+            "sessions": sessions,
+            "rounds": rounds,
+            "seed": seed,
+            "timeout_s": timeout,
+        },
+        "data_bytes": _data_bytes("data/"),
+        "wall_s": round(wall_s, 2),
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": _peak_rss_mb(),
+        "page_load": summarise_latency(results["page_load"]),
+        "outputs": {
+            out: {
+                **summarise_latency(results["latency"][out]),
+                "errors": results["errors"][out],
+                "timeouts": results["timeouts"][out],
+            }
+            for out in OUTPUTS + ["delivered"]
+        },
+    }
+
+
+def print_report(report, baseline=None):
+    """
+    Print the report, with the % change from `baseline` if provided.
+
+    Args:
+        report (dict): Output of `run_load_test()`.
+        baseline (dict, optional): An earlier report to compare with.
+        Defaults to None.
+    """
+
+    def _fmt(metric, now, then):
+        change = ""
+        if baseline is not None and now is not None and then:
+            change = f" ({(now - then) / then * 100:+.1f}%)"
+        print(f"  {metric:<16}{now}{change}")
+
+    settings = report["settings"]
+    print(
+        f"Load test at {report['git_commit']}: {settings['sessions']} sessions x"
+        f" {settings['rounds']} rounds"
+    )
+    if baseline is not None and baseline["settings"] != settings:
+        print("Warning: baseline was run with different settings.")
+    base = baseline or {}
+    print("process")
+    for metric in ["wall_s", "peak_rss_mb", "data_bytes"]:
+        _fmt(metric, report[metric], base.get(metric))
+    sections = [("page_load", report["page_load"], base.get("page_load", {}))]
+    for out, stats in report["outputs"].items():
+        sections.append((out, stats, base.get("outputs", {}).get(out, {})))
+    for name, stats, base_stats in sections:
+        print(name)
+        for metric, value in stats.items():
+            _fmt(metric, value, base_stats.get(metric))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--out", help="Report path. Defaults to outputs/.")
+    parser.add_argument("--baseline", help="Earlier report to compare with.")
+    args = parser.parse_args()
+
+    # resolve paths before importing the app changes the working directory
+    out_pth = args.out or os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "outputs",
+        f"load-test-{datetime.now():%Y-%m-%d-%H%M%S}.json",
+    )
+    out_pth = os.path.abspath(out_pth)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    report = run_load_test(args.sessions, args.rounds, args.seed, args.timeout)
+    print_report(report, baseline)
+    with open(out_pth, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {out_pth}")
@@ -0,0 +1,47 @@
+"""Measure feature areas and lengths independently of the display CRS.
+
+Used by 01-update-db.py to store measurements as columns at build time, so
+that the app does not need to reproject features to report them.
+"""
+import numpy as np
+
+
+def local_equal_area_crs(gdf):
+    """
+    Get a Lambert Azimuthal Equal Area CRS centred on the features.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Features with a geographic or projected CRS.
+
+    Returns:
+        str: PROJ string for the equal area CRS, in metres.
+    """
+    if gdf.crs is None:
+        raise ValueError("`gdf` must have a CRS set.")
+    xmin, ymin, xmax, ymax = gdf.geometry.to_crs(4326).total_bounds
+    lon = (xmin + xmax) / 2
+    lat = (ymin + ymax) / 2
+    return f"+proj=laea +lat_0={lat} +lon_0={lon} +datum=WGS84 +units=m +no_defs"
+
+
+def add_measurements(gdf):
+    """
+    Add area (km2) and length (km) columns computed in an equal area CRS.
+
+    The features are projected once to `local_equal_area_crs()` and the
+    areas and lengths computed over the whole geometry array. The CRS of
+    `gdf` itself is unchanged. For polygons, length is the perimeter.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Features with a CRS set.
+
+    Returns:
+        gpd.GeoDataFrame: `gdf` with "area_km2" and "length_km" columns.
+    """
+    # no bounds to centre the CRS on, eg a layer that was all points
+    if gdf.empty:
+        return gdf.assign(area_km2=np.array([]), length_km=np.array([]))
+    laea = gdf.geometry.to_crs(local_equal_area_crs(gdf))
+    return gdf.assign(
+        area_km2=laea.area.values / 1e6, length_km=laea.length.values / 1e3
+    )
@@ -0,0 +1,151 @@
+"""Per-city feature summaries stored as Parquet, partitioned by city.
+
+01-update-db.py writes one file per city and layer to
+`data/summary/city=<city>/<layer>.parquet`. The app reads every city in one
+query to compare them, without loading any geometry.
+"""
+import os
+
+SUMMARY_DIR = "summary"
+SUMMARY_COLS = ["layer", "category", "count", "area_km2", "length_km", "vintage"]
+
+
+def _summary_schema(partitioned=False):
+    """
+    Arrow schema of the summary files.
+
+    Fixing the schema stops a file with an all-missing column, eg from an
+    empty layer, changing the type that column is read as for every city.
+
+    Args:
+        partitioned (bool, optional): Include the "city" partition column.
+        Defaults to False.
+
+    Returns:
+        pyarrow.Schema: Schema of `SUMMARY_COLS`.
+    """
+    import pyarrow as pa
+
+    fields = [
+        ("layer", pa.string()),
+        ("category", pa.string()),
+        ("count", pa.int64()),
+        ("area_km2", pa.float64()),
+        ("length_km", pa.float64()),
+        ("vintage", pa.string()),
+    ]
+    if partitioned:
+        fields.append(("city", pa.string()))
+    return pa.schema(fields)
+
+
+def summarise_layer(gdf, layer_nm, category_col=None, vint=None):
+    """
+    Summarise count, area & length of a measured layer by category.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Layer with "area_km2" and "length_km"
+        columns, as output by `measure.add_measurements()`.
+        layer_nm (str): Name of the layer, eg "landuse".
+        category_col (str, optional): Column to summarise by. Defaults to
+        None, summarising the whole layer as category "all".
+        vint (str, optional): OSM ingest date. Defaults to None.
+
+    Returns:
+        pd.DataFrame: One row per category, with `SUMMARY_COLS` columns.
+    """
+    import pandas as pd
+
+    cats = "all" if category_col is None else gdf[category_col].values
+    # dropna=False keeps features with a missing category in the totals
+    summ = (
+        pd.DataFrame(
+            {
+                "category": cats,
+                "area_km2": gdf["area_km2"].values,
+                "length_km": gdf["length_km"].values,
+            }
+        )
+        .groupby("category", as_index=False, dropna=False)
+        .agg(
+            count=("area_km2", "size"),
+            area_km2=("area_km2", "sum"),
+            length_km=("length_km", "sum"),
+        )
+    )
+    summ = summ.assign(layer=layer_nm, vintage=vint)
+    return summ.loc[:, SUMMARY_COLS]
+
+
+def write_summary(summ, data_pth, city, layer_nm):
+    """
+    Write a layer summary to the city partition, replacing any earlier one.
+
+    Args:
+        summ (pd.DataFrame): Output of `summarise_layer()`.
+        data_pth (str): Path to the app data folder.
+        city (str): Name of the city, used as the partition value.
+        layer_nm (str): Name of the layer, used as the file name.
+
+    Returns:
+        str: Path to the written Parquet file.
+    """
+    part_pth = os.path.join(data_pth, SUMMARY_DIR, f"city={city}")
+    os.makedirs(part_pth, exist_ok=True)
+    fname = os.path.join(part_pth, f"{layer_nm}.parquet")
+    summ.to_parquet(fname, index=False, schema=_summary_schema())
+    return fname
+
+
+def read_summary(data_pth, layer_nm):
+    """
+    Read the summaries of one layer for all cities.
+
+    Args:
+        data_pth (str): Path to the app data folder.
+        layer_nm (str): Name of the layer, eg "landuse".
+
+    Returns:
+        pd.DataFrame: `SUMMARY_COLS` columns plus "city", for every city
+        with a summary of `layer_nm`. Empty if there is no summary store.
+    """
+    import pandas as pd
+
+    if not os.path.isdir(os.path.join(data_pth, SUMMARY_DIR)):
+        return pd.DataFrame(columns=SUMMARY_COLS + ["city"])
+    return pd.read_parquet(
+        os.path.join(data_pth, SUMMARY_DIR),
+        filters=[("layer", "==", layer_nm)],
+        schema=_summary_schema(partitioned=True),
+    )
+
+
+def compare_cities(summ, metric, top=8):
+    """
+    Rank cities by total `metric`, splitting the totals by category.
+
+    Args:
+        summ (pd.DataFrame): Output of `read_summary()`.
+        metric (str): Column to compare, "count", "area_km2" or "length_km".
+        top (int, optional): Number of categories to keep, largest first.
+        Remaining categories are grouped as "other". Defaults to 8.
+
+    Returns:
+        pd.DataFrame: One row per city, ranked by total `metric` descending,
+        with a column per category and a "total" column. Features with no
+        category are counted as "missing".
+    """
+    # pivot_table drops missing keys, label them to keep them in the totals
+    summ = summ.fillna({"category": "missing"})
+    wide = summ.pivot_table(
+        index="city", columns="category", values=metric, aggfunc="sum", fill_value=0
+    )
+    keep = wide.sum().sort_values(ascending=False).index[:top]
+    other = wide.drop(columns=keep).sum(axis=1)
+    wide = wide.loc[:, keep]
+    if other.any():
+        wide["other"] = other
+    wide["total"] = wide.sum(axis=1)
+    wide = wide.sort_values("total", ascending=False)
+    wide.columns.name = None
+    return wide
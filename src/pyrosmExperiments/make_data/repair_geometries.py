@@ -0,0 +1,158 @@
+import json
+import os
+
+import geopandas as gpd
+import numpy as np
+import pygeos
+
+# feather schema metadata key recording the pbf a boundary cache was built from
+_CACHE_SOURCE_KEY = b"boundary_source"
+
+# GEOS type ids, see pygeos.GeometryType
+_POLYGON_IDS = [3, 6]
+_COLLECTION_ID = 7
+
+
+def repair_geometries(geoms):
+    """
+    Validate and repair an array of polygonal geometries.
+
+    Invalid geometries are repaired with `pygeos.make_valid()`. Where that
+    returns a GeometryCollection, only its polygonal parts are kept, as a
+    MultiPolygon, so that polygonal input stays polygonal. Where no
+    polygonal part remains or the result is still invalid,
+    `pygeos.buffer(geom, 0)` of the original geometry is used instead. All
+    operations are vectorised over the array.
+
+    Args:
+        geoms (array-like): Shapely or pygeos geometries, or a
+        gpd.GeoSeries.
+
+    Returns:
+        numpy.ndarray: Array of repaired pygeos geometries.
+        numpy.ndarray: Array of str naming the fix applied to each geometry,
+        one of "none", "make_valid" or "buffer0".
+    """
+    if isinstance(geoms, gpd.GeoSeries):
+        geoms = geoms.values
+    geoms = np.array(geoms, dtype=object)
+    is_shapely = np.array(
+        [g is not None and not isinstance(g, pygeos.Geometry) for g in geoms],
+        dtype=bool,
+    )
+    geoms[is_shapely] = pygeos.from_shapely(geoms[is_shapely])
+    out = geoms.copy()
+    fixes = np.full(len(geoms), "none", dtype=object)
+
+    invalid = ~pygeos.is_valid(geoms) & ~pygeos.is_missing(geoms)
+    if not invalid.any():
+        return (out, fixes)
+
+    made_valid = pygeos.make_valid(geoms[invalid])
+    made_valid = _keep_polygonal(made_valid)
+    # nothing polygonal left, fall back to buffer(0) for those
+    needs_buffer = pygeos.is_missing(made_valid) | ~np.isin(
+        pygeos.get_type_id(made_valid), _POLYGON_IDS
+    )
+    needs_buffer |= ~pygeos.is_valid(made_valid)
+    made_valid[needs_buffer] = pygeos.buffer(geoms[invalid][needs_buffer], 0)
+
+    out[invalid] = made_valid
+    fixes[invalid] = np.where(needs_buffer, "buffer0", "make_valid")
+
+    return (out, fixes)
+
+
+def _keep_polygonal(geoms):
+    """Replace collections with a MultiPolygon of their polygonal parts."""
+    out = geoms.copy()
+    coll_idx = np.flatnonzero(pygeos.get_type_id(geoms) == _COLLECTION_ID)
+    if len(coll_idx) == 0:
+        return out
+
+    parts, part_idx = pygeos.get_parts(geoms[coll_idx], return_index=True)
+    is_poly = np.isin(pygeos.get_type_id(parts), _POLYGON_IDS)
+    # flatten any MultiPolygon members into their polygons
+    polys, poly_idx = pygeos.get_parts(parts[is_poly], return_index=True)
+    poly_idx = part_idx[is_poly][poly_idx]
+    has_poly = np.unique(poly_idx)
+    # collections without polygonal parts are left for buffer(0)
+    out[coll_idx] = None
+    if len(has_poly):
+        out[coll_idx[has_poly]] = pygeos.multipolygons(
+            polys, indices=np.searchsorted(has_poly, poly_idx)
+        )
+    return out
+
+
+def _boundary_source(osm_obj):
+    """Identify the pbf behind `osm_obj` by its absolute path & mtime."""
+    pth = os.path.abspath(osm_obj.filepath)
+    return {"osm_pth": pth, "mtime": os.path.getmtime(pth)}
+
+
+def _read_boundary_cache(cache_pth, source):
+    """Read `cache_pth` if it was built from `source`, else return None."""
+    from pyarrow import ipc
+
+    if not os.path.exists(cache_pth):
+        return None
+    with ipc.open_file(cache_pth) as reader:
+        meta = reader.schema.metadata or {}
+    if json.loads(meta.get(_CACHE_SOURCE_KEY, b"null")) != source:
+        print(f"{cache_pth} was built from another osm.pbf. Rebuilding.")
+        return None
+    return gpd.read_feather(cache_pth)
+
+
+def _write_boundary_cache(bounds, cache_pth, source):
+    """Write `bounds` to `cache_pth`, recording `source` in the metadata."""
+    from pyarrow import feather
+
+    bounds.to_feather(cache_pth)
+    # geopandas has no option for extra metadata, so add it to the table
+    table = feather.read_table(cache_pth)
+    meta = dict(table.schema.metadata or {})
+    meta[_CACHE_SOURCE_KEY] = json.dumps(source).encode()
+    feather.write_feather(table.replace_schema_metadata(meta), cache_pth)
+
+
+def get_valid_boundaries(osm_obj, cache_pth=None):
+    """
+    Get the boundaries from a pyrosm.OSM object with repaired geometries.
+
+    If `cache_pth` exists and was built from the same osm.pbf file as
+    `osm_obj`, by path and modification time, the previously repaired
+    boundaries are read from it. Otherwise the boundaries are repaired with
+    `repair_geometries()` and written to `cache_pth`, if provided.
+
+    Args:
+        osm_obj (pyrosm.OSM): A pyrosm.OSM object.
+        cache_pth (str, optional): Path to a .arrow file used to cache the
+        repaired boundaries. Defaults to None.
+
+    Returns:
+        gpd.GeoDataFrame: The boundaries, with a "geom_fix" column recording
+        the fix applied to each geometry.
+    """
+    if cache_pth is not None:
+        if not cache_pth.endswith(".arrow"):
+            raise ValueError("Incorrect suffix. Check the `cache_pth` filename.")
+        source = _boundary_source(osm_obj)
+        cached = _read_boundary_cache(cache_pth, source)
+        if cached is not None:
+            return cached
+
+    bounds = osm_obj.get_boundaries()
+    geoms, fixes = repair_geometries(bounds.geometry)
+    bounds = bounds.set_geometry(
+        gpd.GeoSeries(pygeos.to_shapely(geoms), index=bounds.index, crs=bounds.crs)
+    )
+    bounds = bounds.assign(geom_fix=fixes)
+    n_fixed = int((fixes != "none").sum())
+    print(f"Repaired {n_fixed} of {len(fixes)} boundary geometries.")
+
+    if cache_pth is not None:
+        _write_boundary_cache(bounds, cache_pth, source)
+
+    return bounds
@@ -1,12 +1,11 @@
-import pyrosm
 import os
-from shapely.geometry.multipolygon import MultiPolygon
-from shapely.geometry.polygon import Polygon
-import geopandas as gpd
 import re
+from collections import Counter
+
 import numpy as np
-import pygeos
-import pandas as pd
+
+# pyrosm, geopandas, pygeos, pandas & shapely are imported in the functions that
+# use them, so that importing this module does not load the geospatial stack
 
 
 def ingest_osm(osm_pth, bbox=None):
@@ -23,6 +22,9 @@ def ingest_osm(osm_pth, bbox=None):
     Returns:
         pyrosm.OSM object, array of available boundaries within the osm.pbf
     """
+    import pyrosm
+    from shapely.geometry import MultiPolygon, Polygon
+
     pth = os.path.normpath(osm_pth)
 
     if not osm_pth.endswith(".osm.pbf"):
@@ -43,7 +45,30 @@ def ingest_osm(osm_pth, bbox=None):
         return (osm_dat, bounds)
 
 
-def filter_buildings(osm_obj, osm_pth, aoi_pat):
+def get_aoi_boundary(osm_obj, aoi_pat, bounds_gdf=None):
+    """
+    Get the boundary geometry of the first area matching `aoi_pat`.
+
+    Args:
+        osm_obj (pyrosm.pyrosm.OSM): Pyrosm object extracted from the
+        osm.pbf file.
+        aoi_pat (str): The pattern to search for bounding box geometry.
+        bounds_gdf (gpd.GeoDataFrame, optional): Boundaries to search, such
+        as the output of `get_valid_boundaries()`. Defaults to None,
+        searching the boundaries of `osm_obj`.
+
+    Returns:
+        shapely.geometry.Geometry: The boundary geometry.
+    """
+    if bounds_gdf is None:
+        bbox_gdf = osm_obj.get_boundaries(name=aoi_pat)
+    else:
+        # substring match, as `get_boundaries(name=)` does
+        bbox_gdf = bounds_gdf[bounds_gdf.name.str.contains(aoi_pat, na=False)]
+    return bbox_gdf.geometry.values[0]
+
+
+def filter_buildings(osm_obj, osm_pth, aoi_pat, bounds_gdf=None, repair=False):
     """
     Filter osm.pbf to a specific area and return the buildings.
 
@@ -57,21 +82,42 @@ def filter_buildings(osm_obj, osm_pth, aoi_pat):
         a value to the bbox argument.
         osm_pth (str): Path to the osm.pbf file.
         aoi_pat (str): The pattern to search for bounding box geometry.
+        bounds_gdf (gpd.GeoDataFrame, optional): Boundaries to search for
+        the bounding box geometry, such as the output of
+        `get_valid_boundaries()`. Defaults to None, searching the
+        boundaries of `osm_obj`.
+        repair (bool, optional): Should the building geometries be repaired
+        with `repair_geometries()`? Adds a "geom_fix" column recording the
+        fix applied. Defaults to False.
 
     Returns:
         Geopandas GDF with buildings for the area of interest.
     """
+    import geopandas as gpd
+    import pygeos
+    import pyrosm
+
+    from pyrosmExperiments.make_data.repair_geometries import repair_geometries
+
     if not isinstance(osm_obj, pyrosm.pyrosm.OSM):
         raise TypeError("`osm_obj` must be of type pyrosm.OSM.")
     elif not isinstance(aoi_pat, str):
         raise TypeError("`aoi_pat` must be of type str.")
 
-    bbox_gdf = osm_obj.get_boundaries(name=aoi_pat)
-    bbox_geom = bbox_gdf.geometry.values[0]
-
+    bbox_geom = get_aoi_boundary(osm_obj, aoi_pat, bounds_gdf=bounds_gdf)
     aoi_osm = ingest_osm(osm_pth, bbox=bbox_geom)
     aoi_buildings = aoi_osm.get_buildings()
     aoi_buildings = aoi_buildings.assign(aoinm=aoi_pat)
+    if repair:
+        geoms, fixes = repair_geometries(aoi_buildings.geometry)
+        aoi_buildings = aoi_buildings.set_geometry(
+            gpd.GeoSeries(
+                pygeos.to_shapely(geoms),
+                index=aoi_buildings.index,
+                crs=aoi_buildings.crs,
+            )
+        )
+        aoi_buildings = aoi_buildings.assign(geom_fix=fixes)
 
     return aoi_buildings
 
@@ -100,7 +146,86 @@ def clean_aoi(aoinms, rem_pats="(?i)alba|england|united kingdom|north east"):
     return aoinms[~sel]
 
 
-def get_features_recurse(osm_obj, osm_pth, areanms, clean_nms=True):
+def count_features_by_area(
+    osm_obj, osm_pth, areanms, featurenm="building", bounds_gdf=None
+):
+    """
+    Count building categories per area without keeping building geometries.
+
+    Each area is read in turn, exactly as in `filter_buildings()`, and its
+    buildings immediately reduced to their category tags before the next
+    area is read. The counts are those of
+    `summarise_features(get_features_recurse(...))`, including buildings
+    that intersect more than one area, but only one area's buildings are
+    held in memory at a time and no GeoDataFrame is concatenated.
+
+    Args:
+        osm_obj (pyrosm.OSM): A pyrosm.OSM object.
+        osm_pth (str): Path to the osm.pbf file on disk.
+        areanms (numpy.ndarray): Array containing area names from
+        pyrosm.OSM object.
+        featurenm (str, optional): The name of the column containing the
+        features to count. Defaults to "building".
+        bounds_gdf (gpd.GeoDataFrame, optional): Boundaries to search for
+        each area's bounding box geometry, such as the output of
+        `get_valid_boundaries()`. Defaults to None, using the boundaries of
+        `osm_obj`.
+
+    Returns:
+        pandas.core.frame.DataFrame: Summary DF in the format returned by
+        `summarise_features()`.
+        list: Names of areas that threw a pygeos.GEOSException.
+        list: Names of areas with no boundary or no features.
+    """
+    import pandas as pd
+    import pygeos
+    import pyrosm
+
+    if not isinstance(osm_obj, pyrosm.pyrosm.OSM):
+        raise TypeError("`osm_obj` must be of type pyrosm.OSM.")
+
+    pygeos_probs = list()
+    empty_probs = list()
+    counts = Counter()
+    for area in areanms:
+        try:
+            bbox_geom = get_aoi_boundary(osm_obj, area, bounds_gdf=bounds_gdf)
+            feats = ingest_osm(osm_pth, bbox=bbox_geom).get_buildings()
+        except pygeos.GEOSException:
+            print(f"{area} triggered pygoes exception")
+            pygeos_probs.append(area)
+            continue
+        except (AttributeError, IndexError):
+            feats = None
+        # pyrosm returns None if there are no buildings
+        if feats is None:
+            print(f"{area} has no boundary or no features")
+            empty_probs.append(area)
+            continue
+        # mirror value_counts() by ignoring missing categories
+        counts.update((area, tag) for tag in feats[featurenm].dropna().values)
+        del feats
+
+    feat_counts = pd.DataFrame(
+        [(nm, tag, n) for (nm, tag), n in counts.items()],
+        columns=["aoinm", featurenm, "count"],
+    )
+    feat_counts = feat_counts.sort_values(
+        ["aoinm", "count"], ascending=[True, False], ignore_index=True
+    )
+
+    return (_add_class_pc(feat_counts), pygeos_probs, empty_probs)
+
+
+def get_features_recurse(
+    osm_obj,
+    osm_pth,
+    areanms,
+    clean_nms=True,
+    stats_only=False,
+    repair=False,
+    bounds_cache=None,
+):
     """
     Get the building features from an OSM file for all `areanms`.
 
@@ -111,17 +236,44 @@ def get_features_recurse(osm_obj, osm_pth, areanms, clean_nms=True):
         pyrosm.OSM object.
         clean_nms (bool): Should `clean_names()` be used to remove unwanted
         area boundaries? Defaults to True.
+        stats_only (bool): Return only the building category counts per
+        area, as computed by `count_features_by_area()`, rather than the
+        building geometries. Defaults to False.
+        repair (bool): Should boundary and building geometries be repaired
+        before extraction? Areas with invalid boundaries are then extracted
+        rather than skipped. See `get_valid_boundaries()`. Defaults to
+        False.
+        bounds_cache (str, optional): Path to a .arrow file caching the
+        repaired boundaries between runs. Only used if `repair` is True.
+        Defaults to None.
 
     Returns:
         gpd.GeoDataFrame: GeoDataFrame containing the concatenated building
-        DataFrames for all areas that do not throw an exception.
+        DataFrames for all areas that do not throw an exception. If
+        `stats_only` is True, a summary DF in the format returned by
+        `summarise_features()` instead.
         list: Names of areas that threw a pygeos.GEOSException.
         list: Names of areas that threw an AttributeError (likely to be
         areas that contain no features).
     """
+    import geopandas as gpd
+    import pandas as pd
+    import pygeos
+
+    from pyrosmExperiments.make_data.repair_geometries import get_valid_boundaries
+
     if clean_nms:
         areanms = clean_aoi(areanms)
 
+    bounds_gdf = None
+    if repair:
+        bounds_gdf = get_valid_boundaries(osm_obj, cache_pth=bounds_cache)
+
+    if stats_only:
+        return count_features_by_area(
+            osm_obj=osm_obj, osm_pth=osm_pth, areanms=areanms, bounds_gdf=bounds_gdf
+        )
+
     pygeos_probs = list()
     empty_probs = list()
     df_list = list()
@@ -132,6 +284,8 @@ def get_features_recurse(osm_obj, osm_pth, areanms, clean_nms=True):
                 osm_obj=osm_obj,
                 osm_pth=osm_pth,
                 aoi_pat=area,
+                bounds_gdf=bounds_gdf,
+                repair=repair,
             )
             df_list.append(aoi_feats)
         except pygeos.GEOSException:
@@ -164,6 +318,12 @@ def summarise_features(features_gdf, featurenm="building"):
     feat_counts = features_gdf.groupby("aoinm", as_index=False)[
         featurenm
     ].value_counts()
+
+    return _add_class_pc(feat_counts)
+
+
+def _add_class_pc(feat_counts):
+    """Add area totals and % of building category to 2 d.p."""
     feat_counts["aoi_tot"] = (
         feat_counts["count"].groupby(feat_counts.aoinm).transform("sum")
     )
@@ -0,0 +1,89 @@
+import re
+import subprocess
+import sys
+
+# a line of `python -X importtime` output, "import time: self | cumulative | name"
+_IMPORTTIME_PAT = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def profile_imports(stmt, cwd=None, top=20):
+    """
+    Profile the imports triggered by a statement in a fresh interpreter.
+
+    Runs `stmt` with `python -X importtime` and parses the report written to
+    stderr, so that modules cached by the current interpreter do not hide
+    their import cost.
+
+    Args:
+        stmt (str): Python statement to profile, eg "import app".
+        cwd (str, optional): Working directory to run `stmt` in. Defaults to
+        None, the current working directory.
+        top (int, optional): Number of modules to return, ordered by
+        cumulative import time. Defaults to 20. If None, return all.
+
+    Returns:
+        list: Dicts with keys "module", "self_ms", "cumulative_ms" and
+        "depth" (0 for modules imported directly by `stmt`).
+
+    Examples:
+        >>> rows = profile_imports("import json", top=None)
+        >>> "json" in [row["module"] for row in rows]
+        True
+    """
+    if not isinstance(stmt, str):
+        raise TypeError("`stmt` must be of type str.")
+
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", stmt],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    if res.returncode != 0:
+        raise RuntimeError(f"`stmt` failed to run:\n{res.stderr}")
+
+    rows = list()
+    for line in res.stderr.splitlines():
+        match = _IMPORTTIME_PAT.match(line)
+        if match:
+            self_us, cum_us, indent, module = match.groups()
+            rows.append(
+                {
+                    "module": module,
+                    "self_ms": int(self_us) / 1000,
+                    "cumulative_ms": int(cum_us) / 1000,
+                    # importtime indents nested imports by 2 spaces per level
+                    "depth": (len(indent) - 1) // 2,
+                }
+            )
+
+    rows = sorted(rows, key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def print_import_profile(stmt, cwd=None, top=20):
+    """
+    Print the report from `profile_imports()` as a table.
+
+    Args:
+        stmt (str): Python statement to profile, eg "import app".
+        cwd (str, optional): Working directory to run `stmt` in. Defaults to
+        None, the current working directory.
+        top (int, optional): Number of modules to print. Defaults to 20.
+    """
+    rows = profile_imports(stmt, cwd=cwd, top=top)
+    print(f"Import profile for `{stmt}`")
+    # rows are sorted by cumulative time, so nesting is shown as a depth column
+    # rather than as the indented tree of `python -X importtime`
+    print(f"{'cumulative (ms)':>16} {'self (ms)':>10} {'depth':>6}  module")
+    for row in rows:
+        print(
+            f"{row['cumulative_ms']:>16.1f} {row['self_ms']:>10.1f}"
+            f" {row['depth']:>6}  {row['module']}"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python import_profile.py <statement> [cwd]")
+    print_import_profile(sys.argv[1], cwd=sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import geopandas as gpd
+import pygeos
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "pyrosm-cities-app"))
+from compact_geometry import read_layer, write_compact  # noqa: E402
+
+PRECISION = 1e-6
+WKTS = [
+    "POINT (-0.127758 51.507351)",
+    "LINESTRING (-1.5491 53.8008, -1.5502 53.8015, -1.551 53.8)",
+    # exterior ring with two holes
+    "POLYGON ((0 0, 4 0, 4 4, 0 4, 0 0), (1 1, 1 2, 2 2, 2 1, 1 1), "
+    "(3 3, 3 3.5, 3.5 3.5, 3.5 3, 3 3))",
+    "MULTILINESTRING ((0 0, 1 1), (2 2, 3 3, 4 2))",
+    "MULTIPOLYGON (((0 0, 1 0, 1 1, 0 0)), "
+    "((2 2, 5 2, 5 5, 2 5, 2 2), (3 3, 3 4, 4 4, 4 3, 3 3)))",
+    None,
+    "POLYGON EMPTY",
+]
+
+
+@pytest.fixture(params=[True, False], ids=["pygeos", "shapely"])
+def backend(request, monkeypatch):
+    """Run with geopandas using each of its geometry backends."""
+    monkeypatch.setattr(gpd.options, "use_pygeos", request.param)
+    return request.param
+
+
+def _round_trip(gdf, tmp_path):
+    fname = os.path.join(tmp_path, "layer.arrow")
+    write_compact(gdf, fname, precision=PRECISION)
+    return read_layer(fname)
+
+
+def test_round_trip_geometry_types(tmp_path, backend):
+    geoms = gpd.GeoSeries.from_wkt(WKTS, crs=4326)
+    gdf = gpd.GeoDataFrame({"name": list("abcdefg")}, geometry=geoms)
+    out = _round_trip(gdf, tmp_path)
+
+    assert out.crs == gdf.crs
+    assert list(out["name"].astype(str)) == list(gdf["name"])
+    before = pygeos.from_wkb(gdf.geometry.to_wkb().values)
+    after = pygeos.from_wkb(out.geometry.to_wkb().values)
+    for wkt, exp, got in zip(WKTS, before, after):
+        if wkt is None or wkt.endswith("EMPTY"):
+            # empty geometries are stored as missing
+            assert got is None
+        else:
+            assert pygeos.equals_exact(exp, got, tolerance=PRECISION), wkt
+    # the decoded geometries work with the geopandas backend in use
+    assert out.geometry.area.values[2] == pytest.approx(14.75)
+    assert out.geometry.is_valid.sum() == 5
+
+
+def test_round_trip_empty_frame(tmp_path, backend):
+    gdf = gpd.GeoDataFrame({"name": []}, geometry=gpd.GeoSeries([], crs=4326), crs=4326)
+    out = _round_trip(gdf, tmp_path)
+    assert out.empty
+    assert list(out.columns) == ["name", "geometry"]
+    assert out.crs == gdf.crs
+
+
+def test_precision_too_fine(tmp_path):
+    gdf = gpd.GeoDataFrame(geometry=gpd.GeoSeries.from_wkt(WKTS[:1], crs=4326))
+    with pytest.raises(ValueError, match="precision"):
+        write_compact(gdf, os.path.join(tmp_path, "layer.arrow"), precision=1e-9)
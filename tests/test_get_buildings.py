@@ -0,0 +1,88 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+from pyrosmExperiments.make_features import get_buildings
+
+pyrosm = pytest.importorskip("pyrosm")
+
+BOUNDS = gpd.GeoDataFrame(
+    {"name": ["West", "East", "Nowhere"]},
+    geometry=[box(0, 0, 2, 2), box(2, 0, 4, 2), box(10, 10, 11, 11)],
+    crs=4326,
+)
+# buildings straddling x = 2 intersect both areas, one has no category
+BUILDINGS = gpd.GeoDataFrame(
+    {
+        "building": [
+            "house",
+            "house",
+            "church",
+            "retail",
+            "house",
+            None,
+            "retail",
+            "house",
+        ]
+    },
+    geometry=[
+        box(0.1, 0.1, 0.2, 0.2),
+        box(0.5, 0.5, 0.6, 0.6),
+        box(1.9, 0.5, 2.3, 0.6),
+        box(1.95, 1.0, 2.02, 1.1),
+        box(3.0, 1.0, 3.1, 1.1),
+        box(3.5, 1.5, 3.6, 1.6),
+        box(2.5, 0.2, 2.6, 0.3),
+        box(1.2, 1.2, 1.3, 1.3),
+    ],
+    crs=4326,
+)
+
+
+class FakeOSM(pyrosm.OSM):
+    """pyrosm.OSM over in-memory features, keeping those intersecting bbox."""
+
+    def __init__(self, bounding_box=None):
+        self.bounding_box = bounding_box
+
+    def get_boundaries(self, name=None):
+        if name is None:
+            return BOUNDS
+        return BOUNDS[BOUNDS.name.str.contains(name)]
+
+    def get_buildings(self):
+        feats = BUILDINGS
+        if self.bounding_box is not None:
+            feats = feats[feats.intersects(self.bounding_box)]
+        return None if feats.empty else feats.reset_index(drop=True)
+
+
+@pytest.fixture
+def fake_osm(monkeypatch):
+    monkeypatch.setattr(
+        get_buildings,
+        "ingest_osm",
+        lambda osm_pth, bbox=None: FakeOSM(bounding_box=bbox),
+    )
+    return FakeOSM()
+
+
+def test_stats_only_matches_full_mode(fake_osm):
+    areanms = np.array(["West", "East", "Nowhere"])
+    feats, _, full_empty = get_buildings.get_features_recurse(
+        fake_osm, "fake.osm.pbf", areanms, clean_nms=False
+    )
+    stats, _, stats_empty = get_buildings.get_features_recurse(
+        fake_osm, "fake.osm.pbf", areanms, clean_nms=False, stats_only=True
+    )
+    full = get_buildings.summarise_features(feats)
+
+    cols = ["aoinm", "building"]
+    full = full.sort_values(cols, ignore_index=True)
+    stats = stats.sort_values(cols, ignore_index=True)
+    assert list(stats.columns) == list(full.columns)
+    assert stats.equals(full)
+    # straddling buildings are counted in both areas
+    assert full.groupby("aoinm")["count"].sum().to_dict() == {"East": 4, "West": 5}
+    assert stats_empty == full_empty == ["Nowhere"]
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import geopandas as gpd
+import pytest
+from pyproj import Geod
+from shapely.geometry.polygon import orient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "pyrosm-cities-app"))
+from measure import add_measurements  # noqa: E402
+
+GEOD = Geod(ellps="WGS84")
+# features across central Leeds, a few km apart
+WKTS = [
+    "POLYGON ((-1.56 53.79, -1.53 53.79, -1.53 53.81, -1.56 53.81, -1.56 53.79))",
+    "POLYGON ((-1.6 53.77, -1.58 53.77, -1.59 53.785, -1.6 53.77), "
+    "(-1.595 53.772, -1.585 53.772, -1.59 53.78, -1.595 53.772))",
+    "LINESTRING (-1.5491 53.8008, -1.5302 53.8115, -1.501 53.82)",
+]
+
+
+@pytest.mark.parametrize("crs", [4326, 27700])
+def test_measurements_match_geodesic(crs):
+    geoms = gpd.GeoSeries.from_wkt(WKTS, crs=4326)
+    out = add_measurements(gpd.GeoDataFrame(geometry=geoms.to_crs(crs)))
+
+    for geom, area_km2, length_km in zip(geoms, out.area_km2, out.length_km):
+        area, length = 0, GEOD.geometry_length(geom)
+        if geom.geom_type == "Polygon":
+            # geodesic areas are signed by ring orientation, holes opposed
+            area = abs(GEOD.geometry_area_perimeter(orient(geom))[0])
+            # polygon length includes the holes, as in shapely
+            length = GEOD.geometry_length(geom.boundary)
+        assert area_km2 == pytest.approx(area / 1e6, rel=1e-4)
+        assert length_km == pytest.approx(length / 1e3, rel=1e-4)
+    # the CRS of the features is unchanged
+    assert out.crs == geoms.to_crs(crs).crs
+
+
+def test_empty_layer():
+    gdf = gpd.GeoDataFrame(geometry=gpd.GeoSeries([], crs=4326))
+    out = add_measurements(gdf)
+    assert out.empty
+    assert {"area_km2", "length_km"} <= set(out.columns)
@@ -0,0 +1,93 @@
+import os
+
+import geopandas as gpd
+import numpy as np
+import pygeos
+import pytest
+
+from pyrosmExperiments.make_data.repair_geometries import (
+    get_valid_boundaries,
+    repair_geometries,
+)
+
+# self-intersecting at (1, 1), each triangle has area 1
+BOWTIE = "POLYGON ((0 0, 2 2, 2 0, 0 2, 0 0))"
+# the bowtie with a zero-width spike out to (4, 1)
+BOWTIE_SPIKE = "POLYGON ((0 0, 2 2, 2 1, 4 1, 2 1, 2 0, 0 2, 0 0))"
+SQUARE = "POLYGON ((0 0, 1 0, 1 1, 0 1, 0 0))"
+
+
+def _repair(wkts):
+    geoms = pygeos.from_wkt(np.array(wkts, dtype=object))
+    return repair_geometries(geoms)
+
+
+def test_valid_geometries_unchanged():
+    out, fixes = _repair([SQUARE, None])
+    assert pygeos.equals(out[0], pygeos.from_wkt(SQUARE))
+    assert out[1] is None
+    assert list(fixes) == ["none", "none"]
+
+
+@pytest.mark.parametrize("wkt", [BOWTIE, BOWTIE_SPIKE])
+def test_bowtie_keeps_full_area(wkt):
+    out, fixes = _repair([wkt])
+    assert pygeos.is_valid(out[0])
+    assert pygeos.get_type_id(out[0]) in [3, 6]
+    assert pygeos.area(out[0]) == pytest.approx(2)
+    assert list(fixes) == ["make_valid"]
+
+
+def test_spike_dropped_from_polygonal_output():
+    out, _ = _repair([BOWTIE_SPIKE])
+    # only the two triangles remain, the spike line is discarded
+    assert pygeos.get_num_geometries(out[0]) == 2
+    assert pygeos.get_type_id(pygeos.get_parts(out[0])).tolist() == [3, 3]
+
+
+def test_mixed_array_repairs_only_invalid():
+    out, fixes = _repair([SQUARE, BOWTIE_SPIKE, BOWTIE])
+    assert list(fixes) == ["none", "make_valid", "make_valid"]
+    assert pygeos.area(out).tolist() == pytest.approx([1, 2, 2])
+
+
+class FakeOSM:
+    """Stands in for pyrosm.OSM, counting calls to get_boundaries()."""
+
+    def __init__(self, filepath, names):
+        self.filepath = filepath
+        self.names = names
+        self.calls = 0
+
+    def get_boundaries(self):
+        self.calls += 1
+        return gpd.GeoDataFrame(
+            {"name": self.names},
+            geometry=gpd.GeoSeries.from_wkt([SQUARE, BOWTIE]),
+            crs=4326,
+        )
+
+
+def test_boundary_cache_tied_to_source_pbf(tmp_path):
+    pbfs = [tmp_path / "a.osm.pbf", tmp_path / "b.osm.pbf"]
+    for pbf in pbfs:
+        pbf.write_bytes(b"")
+    cache = str(tmp_path / "bounds.arrow")
+
+    osm_a = FakeOSM(str(pbfs[0]), ["a1", "a2"])
+    get_valid_boundaries(osm_a, cache_pth=cache)
+    cached = get_valid_boundaries(osm_a, cache_pth=cache)
+    assert osm_a.calls == 1
+    assert list(cached.name) == ["a1", "a2"]
+    assert list(cached.geom_fix) == ["none", "make_valid"]
+
+    # another pbf at the same cache path rebuilds the cache
+    osm_b = FakeOSM(str(pbfs[1]), ["b1", "b2"])
+    assert list(get_valid_boundaries(osm_b, cache_pth=cache).name) == ["b1", "b2"]
+    assert osm_b.calls == 1
+
+    # so does a newer vintage of the same pbf
+    mtime = os.path.getmtime(pbfs[1]) + 60
+    os.utime(pbfs[1], (mtime, mtime))
+    get_valid_boundaries(osm_b, cache_pth=cache)
+    assert osm_b.calls == 2
@@ -0,0 +1,79 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "pyrosm-cities-app"))
+from summary_store import (  # noqa: E402
+    compare_cities,
+    read_summary,
+    summarise_layer,
+    write_summary,
+)
+
+LANDUSE = pd.DataFrame(
+    {
+        "reclassified_landuse": ["green", None, "green", "industry"],
+        "area_km2": [1.0, 2.0, 3.0, 0.5],
+        "length_km": [4.0, 6.0, 8.0, 3.0],
+    }
+)
+
+
+def test_summarise_layer_by_category():
+    summ = summarise_layer(LANDUSE, "landuse", "reclassified_landuse", "2023-01-01")
+    summ = summ.set_index("category", drop=False)
+    assert summ.loc["green", "count"] == 2
+    assert summ.loc["green", "area_km2"] == 4.0
+    # features with a missing category are kept in the totals
+    assert summ["count"].sum() == 4
+    assert summ["area_km2"].sum() == pytest.approx(6.5)
+    assert summ["length_km"].sum() == pytest.approx(21.0)
+    assert set(summ.layer) == {"landuse"}
+    assert set(summ.vintage) == {"2023-01-01"}
+
+
+def test_summarise_layer_without_category():
+    summ = summarise_layer(LANDUSE, "net-driving")
+    assert summ.category.tolist() == ["all"]
+    assert summ["count"].tolist() == [4]
+    assert summ.vintage.isna().all()
+
+
+def test_read_summary_with_empty_layer(tmp_path):
+    # an empty layer has an all-missing category, written before other cities
+    empty = summarise_layer(LANDUSE.iloc[:0], "landuse", "reclassified_landuse")
+    write_summary(empty, tmp_path, "aberdeen", "landuse")
+    summ = summarise_layer(LANDUSE, "landuse", "reclassified_landuse", "2023-01-01")
+    write_summary(summ, tmp_path, "london", "landuse")
+    write_summary(summarise_layer(LANDUSE, "natural"), tmp_path, "london", "natural")
+
+    out = read_summary(tmp_path, "landuse")
+    assert set(out.city) == {"london"}
+    assert set(out.layer) == {"landuse"}
+    assert out["count"].sum() == 4
+    assert out.category.isna().sum() == 1
+
+
+def test_read_summary_without_store(tmp_path):
+    out = read_summary(tmp_path, "landuse")
+    assert out.empty
+    assert "city" in out.columns
+
+
+def test_compare_cities():
+    summ = pd.DataFrame(
+        {
+            "city": ["leeds", "leeds", "leeds", "lille", "lille"],
+            "category": ["green", "industry", None, "green", "water"],
+            "area_km2": [1.0, 2.0, 0.5, 4.0, 1.0],
+        }
+    )
+    wide = compare_cities(summ, "area_km2", top=2)
+    # ranked by total, missing categories are kept in the totals
+    assert wide.index.tolist() == ["lille", "leeds"]
+    assert wide["total"].tolist() == [5.0, 3.5]
+    assert wide.columns.tolist() == ["green", "industry", "other", "total"]
+    assert wide.loc["leeds", "other"] == 0.5
+    assert wide.loc["lille", "other"] == 1.0